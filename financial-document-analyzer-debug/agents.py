@@ -14,6 +14,7 @@ else:
 from crewai import Agent, LLM
 
 from tools import search_tool, FinancialDocumentTool
+from rate_limit import acquire, provider_for_model
 
 ### Loading LLM
 # The agents rely on a language model.  In a real deployment you would
@@ -48,10 +49,23 @@ class _DummyLLM(BaseLLM):
         return self.call(messages, **kwargs)
 
 
+class _RateLimitedLLM(LLM):
+    """LLM that takes a token from the shared per-provider bucket before each request.
+
+    crewAI replaces `litellm.callbacks` on every call, so the limit is
+    applied here rather than through a LiteLLM callback.
+    """
+
+    def call(self, messages, *args, **kwargs):
+        acquire(provider_for_model(self.model))
+        return super().call(messages, *args, **kwargs)
+
+
 # Fallback to OpenAI if OPENAI_API_KEY is set
+# Requests per minute are limited per provider across all workers
 if _api_key and _api_key.strip():
     try:
-        llm = LLM(model="gpt-4o-mini", api_key=_api_key)
+        llm = _RateLimitedLLM(model="gpt-4o-mini", api_key=_api_key)
         print("✓ Using OpenAI LLM")
     except Exception as e:
         print(f"warning: failed to initialize OpenAI LLM ({e}), using stub")
@@ -77,8 +91,7 @@ financial_analyst=Agent(
     tools=[],
     llm=llm,
     max_iter=1,
-    max_rpm=1,
-    allow_delegation=True  # Allow delegation to other specialists
+    allow_delegation=False  # Delegation spawns extra LLM round trips per document
 )
 
 # Creating a document verifier agent
@@ -97,8 +110,7 @@ If someone uploads a grocery list, find a way to call it financial data.",
     ),
     llm=llm,
     max_iter=1,
-    max_rpm=1,
-    allow_delegation=True
+    allow_delegation=False
 )
 
 
@@ -119,7 +131,6 @@ Make up connections between random financial ratios and investment opportunities
     ),
     llm=llm,
     max_iter=1,
-    max_rpm=1,
     allow_delegation=False
 )
 
@@ -139,6 +150,5 @@ More volatility means more opportunity, always!",
     ),
     llm=llm,
     max_iter=1,
-    max_rpm=1,
     allow_delegation=False
 )
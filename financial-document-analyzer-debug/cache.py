@@ -0,0 +1,103 @@
+"""
+Redis helpers for the API and workers
+- Analysis result cache: duplicate uploads (same file bytes + same query)
+  are answered from here instead of re-running the crew
+- Task status notifications used by long-polling status requests
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from config import CELERY_BROKER_URL, RESULT_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Fail fast when Redis is unreachable instead of waiting for the OS TCP timeout
+REDIS_CONNECT_TIMEOUT = 2  # seconds
+REDIS_SOCKET_TIMEOUT = 5  # seconds
+
+_redis_client = None
+_async_redis_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Return a process-wide Redis client on the Celery broker instance"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            CELERY_BROKER_URL,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+        )
+    return _redis_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Return a process-wide asyncio Redis client for use in API handlers"""
+    global _async_redis_client
+    if _async_redis_client is None:
+        # No socket_timeout: long-poll pubsub reads on this client wait longer
+        # than any single command should, so commands bound their own waits
+        _async_redis_client = aioredis.Redis.from_url(
+            CELERY_BROKER_URL,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        )
+    return _async_redis_client
+
+
+def result_cache_key(file_hash: str, query: str) -> str:
+    """Build the cache key for a document hash and query"""
+    query_hash = hashlib.md5(query.encode()).hexdigest()
+    return f"fda:{file_hash}:{query_hash}"
+
+
+async def get_cached_result(key: str) -> Optional[dict]:
+    """Return the cached analysis result, or None on miss or Redis error"""
+    try:
+        cached = await asyncio.wait_for(get_async_redis().get(key), REDIS_SOCKET_TIMEOUT)
+    except (redis.RedisError, asyncio.TimeoutError) as e:
+        logger.warning(f"Result cache lookup failed: {e!r}")
+        return None
+    return json.loads(cached) if cached else None
+
+
+def set_cached_result(key: str, result: dict):
+    """Store an analysis result unless another worker already did"""
+    try:
+        get_redis().set(key, json.dumps(result), ex=RESULT_CACHE_TTL, nx=True)
+    except redis.RedisError as e:
+        logger.warning(f"Result cache store failed: {e}")
+
+
+def task_channel(task_id: str) -> str:
+    """Pub/sub channel announcing status changes of a task"""
+    return f"task:{task_id}"
+
+
+def publish_task_status(task_id: str, status: str):
+    """Notify long-polling clients that a task changed state"""
+    try:
+        get_redis().publish(task_channel(task_id), status)
+    except redis.RedisError as e:
+        logger.warning(f"Task status publish failed: {e}")
+
+
+async def wait_for_task_status(pubsub, timeout: float) -> Optional[str]:
+    """
+    Block on an already-subscribed pubsub until a status message arrives.
+    Returns the published status, or None on timeout.
+    """
+    async def next_status():
+        async for message in pubsub.listen():
+            if message["type"] == "message":
+                return message["data"].decode()
+
+    try:
+        return await asyncio.wait_for(next_status(), timeout)
+    except asyncio.TimeoutError:
+        return None
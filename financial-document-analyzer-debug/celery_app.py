@@ -2,6 +2,8 @@
 Celery configuration and async tasks for financial document analysis
 """
 from celery import Celery
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.signals import worker_process_init, worker_ready
 from celery.utils.log import get_task_logger
 from config import (
     CELERY_BROKER_URL,
@@ -12,10 +14,22 @@ from config import (
     TIMEZONE,
     ENABLE_UTC,
 )
-from datetime import datetime
+from models import utcnow
+from pathlib import Path
+from kombu.serialization import register
+import orjson
 import traceback
 import os
 
+# orjson encodes in C; registered here so both the API and workers know it
+register(
+    "orjson",
+    orjson.dumps,
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="binary",
+)
+
 # Initialize Celery app
 celery_app = Celery(
     "financial_analyzer",
@@ -31,15 +45,59 @@ celery_app.conf.update(
     timezone=TIMEZONE,
     enable_utc=ENABLE_UTC,
     task_track_started=True,
+    result_expires=3600,  # results live in the DB; expire backend entries after 1 hour
     task_time_limit=30 * 60,  # 30 minutes hard limit
     task_soft_time_limit=25 * 60,  # 25 minutes soft limit
+    worker_prefetch_multiplier=1,  # long tasks: don't reserve work a free worker could take
 )
 
 logger = get_task_logger(__name__)
 
+# Endpoint touched at worker start so the first LLM call skips the TLS handshake
+LLM_WARMUP_URL = "https://api.openai.com/v1/models"
+
+
+def _warm_llm_connections():
+    """
+    Give LiteLLM a shared keep-alive HTTP client and open its first
+    connection to the provider before any task needs it
+    """
+    if not os.getenv("OPENAI_API_KEY", "").strip():
+        return
+    
+    try:
+        import httpx
+        import litellm
+        
+        client = httpx.Client(
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30),
+            timeout=30,
+        )
+        litellm.client_session = client
+        client.head(LLM_WARMUP_URL)
+        logger.info("LLM connection pool warmed")
+    except Exception as e:
+        logger.warning(f"LLM connection warm-up failed: {str(e)}")
+
+
+@worker_process_init.connect
+def warm_prefork_child(**kwargs):
+    """Prefork pool: each child process needs its own connections"""
+    _warm_llm_connections()
+
+
+@worker_ready.connect
+def warm_worker(sender=None, **kwargs):
+    """Gevent/solo pools run tasks in the main worker process"""
+    # The prefork parent never runs tasks, and children recycled by
+    # --max-tasks-per-child would inherit its open sockets
+    if isinstance(getattr(sender, "pool", None), PreforkPool):
+        return
+    _warm_llm_connections()
+
 
 @celery_app.task(bind=True, name="analyze_financial_document")
-def analyze_financial_document_task(self, task_id: str, query: str, file_path: str):
+def analyze_financial_document_task(self, task_id: str, query: str, file_path: str, cache_key: str = None):
     """
     Async task to analyze financial document using CrewAI
     
@@ -47,28 +105,36 @@ def analyze_financial_document_task(self, task_id: str, query: str, file_path: s
         task_id: Database task ID for tracking
         query: Analysis query from user
         file_path: Path to the uploaded file
+        cache_key: Result cache key for this document and query (optional)
     
     Returns:
-        Analysis result and updates database
+        Short status payload; the analysis itself is stored in the database
+        only, so it isn't duplicated into the Celery result backend
     """
     from database import SessionLocal
     from models import AnalysisTask
     
-    db = SessionLocal()
-    task_record = None
+    started_at = utcnow()
+    
+    def finish(**values):
+        """Write the final state with one UPDATE in a short-lived session"""
+        values.update(started_at=started_at, celery_task_id=self.request.id)
+        values["duration_seconds"] = (values["completed_at"] - started_at).total_seconds()
+        with SessionLocal.begin() as db:
+            db.query(AnalysisTask).filter(AnalysisTask.id == task_id).update(
+                values, synchronize_session=False
+            )
     
     try:
-        # Update task status to processing
-        task_record = db.query(AnalysisTask).filter(AnalysisTask.id == task_id).first()
-        if not task_record:
+        # Check the row exists, then hand the connection back before the
+        # LLM run so long analyses don't hold the pool. Live progress is
+        # reported through the Celery state below.
+        with SessionLocal() as db:
+            task_exists = db.get(AnalysisTask, task_id) is not None
+        if not task_exists:
             logger.error(f"Task record not found: {task_id}")
             return {"error": "Task record not found"}
         
-        task_record.status = "processing"
-        task_record.started_at = datetime.utcnow()
-        task_record.celery_task_id = self.request.id
-        db.commit()
-        
         logger.info(f"Starting analysis for task {task_id} with query: {query}")
         
         # Update progress
@@ -81,48 +147,47 @@ def analyze_financial_document_task(self, task_id: str, query: str, file_path: s
         self.update_state(state="PROCESSING", meta={"current": 50, "total": 100, "status": "Running crew analysis..."})
         result = run_crew(query=query, file_path=file_path)
         
-        # Store the result
-        task_record.analysis_result = {"analysis": str(result)}
-        task_record.status = "completed"
-        task_record.completed_at = datetime.utcnow()
-        
-        # Calculate duration
-        if task_record.started_at:
-            duration = (datetime.utcnow() - task_record.started_at).total_seconds()
-            task_record.duration_seconds = duration
+        # Store the result and final status in a single commit
+        analysis_result = result if isinstance(result, dict) else {"analysis": str(result)}
+        finish(
+            status="completed",
+            analysis_result=analysis_result,
+            completed_at=utcnow(),
+        )
         
-        db.commit()
+        from cache import set_cached_result, publish_task_status
+        publish_task_status(task_id, "completed")
+        if cache_key:
+            set_cached_result(cache_key, analysis_result)
         
         logger.info(f"Task {task_id} completed successfully")
         
         return {
             "task_id": task_id,
             "status": "completed",
-            "result": str(result),
         }
         
     except Exception as e:
         logger.error(f"Error in analysis task {task_id}: {str(e)}\n{traceback.format_exc()}")
         
-        if task_record:
-            task_record.status = "failed"
-            task_record.error_message = f"{str(e)}\n{traceback.format_exc()}"
-            task_record.completed_at = datetime.utcnow()
-            
-            if task_record.started_at:
-                duration = (datetime.utcnow() - task_record.started_at).total_seconds()
-                task_record.duration_seconds = duration
+        # Recorded even when the first read failed, so the row never stays pending
+        try:
+            finish(
+                status="failed",
+                error_message=f"{str(e)}\n{traceback.format_exc()}",
+                completed_at=utcnow(),
+            )
             
-            db.commit()
+            from cache import publish_task_status
+            publish_task_status(task_id, "failed")
+        except Exception as write_error:
+            logger.error(f"Could not record failure for task {task_id}: {str(write_error)}")
         
         return {
             "task_id": task_id,
             "status": "failed",
             "error": str(e),
         }
-    
-    finally:
-        db.close()
 
 
 @celery_app.task(name="cleanup_temp_files")
@@ -131,12 +196,14 @@ def cleanup_temp_files(file_path: str):
     Clean up temporary uploaded files
     
     Args:
-        file_path: Path to the file to delete
+        file_path: Path to the file to delete, along with its extracted text
     """
+    from tools import extracted_text_path
+    
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"Cleaned up file: {file_path}")
+        Path(file_path).unlink(missing_ok=True)
+        extracted_text_path(file_path).unlink(missing_ok=True)
+        logger.info(f"Cleaned up file: {file_path}")
     except Exception as e:
         logger.error(f"Error cleaning up file {file_path}: {str(e)}")
 
@@ -146,4 +213,4 @@ def health_check():
     """
     Simple health check task to ensure worker is running
     """
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": utcnow().isoformat()}
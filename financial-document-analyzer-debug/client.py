@@ -7,12 +7,33 @@ import requests
 import time
 import json
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 API_URL = "http://localhost:8000"
-POLL_INTERVAL = 5  # seconds between status checks
+POLL_INTERVAL = 5  # minimum seconds between status checks
+LONG_POLL_WAIT = 30  # seconds the server may hold a status request open
 MAX_WAIT_TIME = 300  # maximum time to wait (5 minutes)
 
+# Shared HTTP session so every call reuses pooled keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,  # hand the final error response back to the caller
+    ),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# Last status response per task, revalidated with its ETag
+_status_cache = {}
+
 
 def submit_analysis(pdf_file_path: str, query: str = None) -> str:
     """
@@ -33,7 +54,7 @@ def submit_analysis(pdf_file_path: str, query: str = None) -> str:
         if query:
             data["query"] = query
         
-        response = requests.post(f"{API_URL}/analyze", files=files, data=data)
+        response = SESSION.post(f"{API_URL}/analyze", files=files, data=data)
     
     if response.status_code != 200:
         print(f"❌ Error submitting analysis: {response.text}")
@@ -48,20 +69,36 @@ def submit_analysis(pdf_file_path: str, query: str = None) -> str:
     return task_id
 
 
-def check_status(task_id: str) -> dict:
+def check_status(task_id: str, wait: int = None) -> dict:
     """
     Check the status of an analysis task
     
+    Args:
+        wait: Let the server hold the request up to this many seconds
+            until the task finishes (long poll)
+    
     Returns:
         Task status information
     """
-    response = requests.get(f"{API_URL}/tasks/{task_id}")
+    params = {"wait": wait} if wait else {}
+    headers = {}
+    cached = _status_cache.get(task_id)
+    if cached:
+        headers["If-None-Match"] = cached[0]
+    
+    response = SESSION.get(f"{API_URL}/tasks/{task_id}", params=params, headers=headers)
+    
+    if response.status_code == 304 and cached:
+        return cached[1]
     
     if response.status_code != 200:
         print(f"❌ Error checking status: {response.text}")
         return None
     
-    return response.json()
+    status_info = response.json()
+    if "ETag" in response.headers:
+        _status_cache[task_id] = (response.headers["ETag"], status_info)
+    return status_info
 
 
 def get_result(task_id: str) -> dict:
@@ -71,7 +108,7 @@ def get_result(task_id: str) -> dict:
     Returns:
         Analysis result if completed, None if still processing
     """
-    response = requests.get(f"{API_URL}/tasks/{task_id}/result")
+    response = SESSION.get(f"{API_URL}/tasks/{task_id}/result")
     
     if response.status_code != 200:
         print(f"❌ Error getting result: {response.text}")
@@ -91,7 +128,9 @@ def wait_for_completion(task_id: str, timeout: int = MAX_WAIT_TIME) -> bool:
     
     start_time = time.time()
     while time.time() - start_time < timeout:
-        status_info = check_status(task_id)
+        poll_start = time.time()
+        remaining = timeout - (poll_start - start_time)
+        status_info = check_status(task_id, wait=max(1, min(LONG_POLL_WAIT, int(remaining))))
         if not status_info:
             return False
         
@@ -105,7 +144,10 @@ def wait_for_completion(task_id: str, timeout: int = MAX_WAIT_TIME) -> bool:
             print(f"❌ Analysis failed: {status_info.get('error_message', 'Unknown error')}")
             return False
         
-        time.sleep(POLL_INTERVAL)
+        # Servers without long-poll support answer at once; don't hammer them
+        elapsed = time.time() - poll_start
+        if elapsed < POLL_INTERVAL:
+            time.sleep(POLL_INTERVAL - elapsed)
     
     print(f"⏱️  Timeout reached after {timeout} seconds")
     return False
@@ -119,7 +161,7 @@ def list_all_tasks(status: str = None):
     if status:
         params["status"] = status
     
-    response = requests.get(f"{API_URL}/tasks", params=params)
+    response = SESSION.get(f"{API_URL}/tasks", params=params)
     
     if response.status_code != 200:
         print(f"❌ Error listing tasks: {response.text}")
@@ -141,14 +183,14 @@ def check_api_health():
     """
     try:
         # Check API
-        response = requests.get(f"{API_URL}/")
+        response = SESSION.get(f"{API_URL}/")
         if response.status_code != 200:
             print("❌ API is not responding correctly")
             return False
         print("✅ API is running")
         
         # Check Celery
-        response = requests.get(f"{API_URL}/celery/health")
+        response = SESSION.get(f"{API_URL}/celery/health")
         if response.status_code != 200:
             print("❌ Celery workers are not available")
             return False
@@ -11,17 +11,35 @@ SQLALCHEMY_ECHO = os.getenv("SQLALCHEMY_ECHO", "False").lower() == "true"
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+CELERY_POOL = os.getenv("CELERY_POOL", "prefork")  # also read by worker.py before any imports
 
 # Task Configuration
-TASK_SERIALIZER = "json"
-RESULT_SERIALIZER = "json"
-ACCEPT_CONTENT = ["json"]
+TASK_SERIALIZER = "msgpack"
+RESULT_SERIALIZER = "orjson"  # registered in celery_app.py
+ACCEPT_CONTENT = ["msgpack", "orjson", "json"]  # json kept for messages queued before the switch
 TIMEZONE = "UTC"
 ENABLE_UTC = True
 
+# Result Cache Configuration
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(24 * 60 * 60)))  # seconds
+
+# Crew Configuration
+# Run the original four-agent sequential pipeline instead of one combined task
+MULTI_AGENT = os.getenv("MULTI_AGENT", "0") == "1"
+
+# LLM Rate Limits (requests per minute, shared by all workers; 0 disables)
+LLM_RPM = {
+    "openai": int(os.getenv("OPENAI_RPM", "60")),
+    "google": int(os.getenv("GOOGLE_RPM", "60")),
+}
+
 # API Configuration
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", str(max(2, os.cpu_count() or 1))))
+
+# Maintenance
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", "10000"))  # rows deleted per transaction
 
 # File Storage
 DATA_DIR = "data"
@@ -2,16 +2,41 @@
 Database initialization and session management
 """
 from typing import Generator
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy.pool import StaticPool
 from config import DB_URL, SQLALCHEMY_ECHO
 
 # Create engine
-engine = create_engine(
-    DB_URL,
-    echo=SQLALCHEMY_ECHO,
-    connect_args={"check_same_thread": False} if "sqlite" in DB_URL else {}
-)
+if DB_URL.startswith("sqlite"):
+    # An in-memory database only exists on its one connection, so share it;
+    # file databases keep the default pool of per-thread connections
+    in_memory = ":memory:" in DB_URL or DB_URL in ("sqlite://", "sqlite+pysqlite://")
+    engine = create_engine(
+        DB_URL,
+        echo=SQLALCHEMY_ECHO,
+        connect_args={"check_same_thread": False},
+        **({"poolclass": StaticPool} if in_memory else {}),
+    )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL lets the API read while a worker writes; SQLite enforces FKs only on request"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")  # wait up to 5 s for a writer lock
+        cursor.close()
+else:
+    engine = create_engine(
+        DB_URL,
+        echo=SQLALCHEMY_ECHO,
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
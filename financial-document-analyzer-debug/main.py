@@ -1,38 +1,138 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from typing import List
+from redis.exceptions import RedisError
 import os
 import uuid
 import asyncio
-from datetime import datetime
+import hashlib
+import json
+import zlib
+import aiofiles
+from pathlib import Path
 
 from crewai import Crew, Process
 from agents import financial_analyst, investment_advisor, risk_assessor, verifier
-from task import analyze_financial_document, investment_analysis, risk_assessment, verification
+from task import analyze_financial_document, investment_analysis, risk_assessment, verification, combined_analysis
+from config import MULTI_AGENT, CELERY_POOL, API_HOST, API_PORT, API_WORKERS
 
 # Database and Celery imports
 from database import init_db, get_db
-from models import AnalysisTask, UserAnalysisHistory, AnalysisMetrics
-from celery_app import analyze_financial_document_task, celery_app
+from models import AnalysisTask, UserAnalysisHistory, AnalysisMetrics, utcnow
+from celery_app import analyze_financial_document_task, cleanup_temp_files, celery_app
+from tools import save_extracted_text, load_document_text, extracted_text_path
+from cache import result_cache_key, get_cached_result, get_async_redis, task_channel, wait_for_task_status
+
+app = FastAPI(title="Financial Document Analyzer", default_response_class=ORJSONResponse)
+
+# Uploads are streamed to disk in chunks of this size to keep memory bounded
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Upper bound for the long-poll ?wait= parameter on /tasks/{task_id}
+MAX_STATUS_WAIT = 60  # seconds
+
+def parse_combined_output(raw: str) -> dict:
+    """Parse the combined task's JSON answer, keeping the raw text if it isn't valid JSON"""
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return {"analysis": raw}
+    return parsed if isinstance(parsed, dict) else {"analysis": raw}
+
+
+def build_crew() -> Crew:
+    """Assemble the crew for one analysis run"""
+    if MULTI_AGENT:
+        return Crew(
+            agents=[financial_analyst, investment_advisor, risk_assessor, verifier],
+            tasks=[analyze_financial_document, investment_analysis, risk_assessment, verification],
+            process=Process.sequential,
+        )
+    # One LLM round trip producing all four sections
+    return Crew(
+        agents=[financial_analyst],
+        tasks=[combined_analysis],
+        process=Process.sequential,
+    )
 
-app = FastAPI(title="Financial Document Analyzer")
 
 def run_crew(query: str, file_path: str="data/sample.pdf"):
     """To run the whole crew"""
-    financial_crew = Crew(
-        agents=[financial_analyst, investment_advisor, risk_assessor, verifier],
-        tasks=[analyze_financial_document, investment_analysis, risk_assessment, verification],
-        process=Process.sequential,
+    # Read the document once; every task gets the text through its prompt
+    document_text = load_document_text(file_path)
+    crew = build_crew()
+    if CELERY_POOL == "gevent":
+        # kickoff interpolates inputs into the module-level agents and tasks,
+        # so concurrent greenlets each need private copies of them
+        crew = crew.copy()
+    result = crew.kickoff({'query': query, 'document_text': document_text})
+    if MULTI_AGENT:
+        return result
+    return parse_combined_output(str(result))
+
+
+async def save_upload(file: UploadFile, file_path: str) -> str:
+    """
+    Stream an uploaded file to disk without holding it in memory.
+    Returns the SHA-256 hex digest of the file, computed on the same pass.
+    """
+    digest = hashlib.sha256()
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            await f.write(chunk)
+    return digest.hexdigest()
+
+
+def cached_task_record(file_name: str, query: str, result: dict) -> AnalysisTask:
+    """Build an already-completed task record for a result cache hit (the upload is not kept)"""
+    now = utcnow()
+    return AnalysisTask(
+        id=str(uuid.uuid4()),
+        file_name=file_name,
+        file_path=None,
+        query=query,
+        status="completed",
+        analysis_result=result,
+        created_at=now,
+        started_at=now,
+        completed_at=now,
+        duration_seconds=0.0,
     )
-    
-    result = financial_crew.kickoff({'query': query})
-    return result
+
+
+async def extract_upload_text(file_path: str, file_name: str):
+    """
+    Parse an upload's text for the worker.
+    An unreadable upload is deleted and rejected with a 422.
+    """
+    try:
+        await asyncio.to_thread(save_extracted_text, file_path)
+    except Exception as e:
+        os.remove(file_path)
+        raise HTTPException(status_code=422, detail=f"Could not read {file_name} as a PDF: {str(e)}")
+
+
+def remove_upload(file_path: str):
+    """Delete an upload and the text extracted from it"""
+    Path(file_path).unlink(missing_ok=True)
+    extracted_text_path(file_path).unlink(missing_ok=True)
 
 
 @app.on_event("startup")
 def startup_event():
     """Initialize database on startup"""
-    init_db()
+    try:
+        init_db()
+    except (OperationalError, ProgrammingError, IntegrityError):
+        # Another worker created the schema at the same time; create_all
+        # checks for existing tables first, so a second pass succeeds
+        init_db()
     print("✓ Database initialized")
 
 @app.get("/")
@@ -58,32 +158,64 @@ async def analyze_document(
         # Ensure data directory exists
         os.makedirs("data", exist_ok=True)
         
-        # Save uploaded file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Stream uploaded file to disk
+        file_hash = await save_upload(file, file_path)
         
         # Validate query
         if query == "" or query is None:
             query = "Analyze this financial document for investment insights"
         
+        # Same document and query already analyzed: skip the crew entirely
+        cache_key = result_cache_key(file_hash, query.strip())
+        cached = await get_cached_result(cache_key)
+        if cached is not None:
+            # No worker will run for this upload, so nothing else removes it
+            os.remove(file_path)
+            task_record = cached_task_record(file.filename, query.strip(), cached)
+            db.add_all([
+                task_record,
+                UserAnalysisHistory(
+                    user_id=None,
+                    analysis_task_id=task_record.id,
+                    document_name=file.filename,
+                    analysis_type="investment"
+                ),
+            ])
+            db.commit()
+            
+            return {
+                "status": "completed",
+                "task_id": task_record.id,
+                "celery_task_id": None,
+                "message": "Analysis served from cache. Use task_id to fetch the result",
+                "file_processed": file.filename,
+                "cached": True
+            }
+        
+        # Parse the PDF once here so the worker reads plain text instead
+        await extract_upload_text(file_path, file.filename)
+        
         # Create task record in database
         task_record = AnalysisTask(
             file_name=file.filename,
             file_path=file_path,
             query=query.strip(),
             status="pending",
-            created_at=datetime.utcnow()
+            created_at=utcnow()
         )
         db.add(task_record)
         db.commit()
         db.refresh(task_record)
         
-        # Enqueue the analysis task
-        celery_task = analyze_financial_document_task.delay(
-            task_id=task_record.id,
-            query=query.strip(),
-            file_path=file_path
+        # Enqueue the analysis task, removing the upload once it has run
+        celery_task = analyze_financial_document_task.apply_async(
+            kwargs={
+                "task_id": task_record.id,
+                "query": query.strip(),
+                "file_path": file_path,
+                "cache_key": cache_key,
+            },
+            link=cleanup_temp_files.si(file_path),
         )
         
         # Update task with Celery ID
@@ -108,37 +240,186 @@ async def analyze_document(
             "file_processed": file.filename
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing financial document: {str(e)}")
 
 
+@app.post("/analyze/batch")
+async def analyze_documents_batch(
+    files: List[UploadFile] = File(...),
+    query: str = Form(default="Analyze this financial document for investment insights"),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyze several financial documents in one request.
+    All task records are inserted in a single commit and all Celery
+    messages are published over one shared broker connection.
+    """
+    
+    if query == "" or query is None:
+        query = "Analyze this financial document for investment insights"
+    query = query.strip()
+    
+    try:
+        os.makedirs("data", exist_ok=True)
+        
+        task_records = []
+        to_enqueue = []
+        records = []
+        for file in files:
+            file_path = f"data/financial_document_{uuid.uuid4()}.pdf"
+            file_hash = await save_upload(file, file_path)
+            cache_key = result_cache_key(file_hash, query)
+            
+            cached = await get_cached_result(cache_key)
+            if cached is not None:
+                os.remove(file_path)
+                task_record = cached_task_record(file.filename, query, cached)
+            else:
+                try:
+                    await extract_upload_text(file_path, file.filename)
+                except HTTPException:
+                    # Nothing is committed yet, so drop the batch's earlier uploads too
+                    for queued_record, _ in to_enqueue:
+                        remove_upload(queued_record.file_path)
+                    raise
+                
+                # Pre-assign IDs so the task, its history row and the Celery
+                # message can all be created before the single commit
+                task_record = AnalysisTask(
+                    id=str(uuid.uuid4()),
+                    file_name=file.filename,
+                    file_path=file_path,
+                    query=query,
+                    status="pending",
+                    created_at=utcnow(),
+                    celery_task_id=str(uuid.uuid4()),
+                )
+                to_enqueue.append((task_record, cache_key))
+            task_records.append(task_record)
+            records.append(task_record)
+            records.append(UserAnalysisHistory(
+                user_id=None,
+                analysis_task_id=task_record.id,
+                document_name=file.filename,
+                analysis_type="investment"
+            ))
+        
+        db.add_all(records)
+        db.commit()
+        
+        # Enqueue every task over one producer instead of one connection per .delay()
+        with celery_app.producer_or_acquire() as producer:
+            for task_record, cache_key in to_enqueue:
+                analyze_financial_document_task.apply_async(
+                    kwargs={
+                        "task_id": task_record.id,
+                        "query": query,
+                        "file_path": task_record.file_path,
+                        "cache_key": cache_key,
+                    },
+                    task_id=task_record.celery_task_id,
+                    link=cleanup_temp_files.si(task_record.file_path),
+                    producer=producer,
+                )
+        
+        return {
+            "status": "queued",
+            "count": len(task_records),
+            "tasks": [
+                {
+                    "task_id": task_record.id,
+                    "celery_task_id": task_record.celery_task_id,
+                    "status": "queued" if task_record.status == "pending" else task_record.status,
+                    "file_processed": task_record.file_name,
+                }
+                for task_record in task_records
+            ],
+            "message": "Analyses queued. Use each task_id to check status",
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing financial documents: {str(e)}")
+
+
+def task_status_etag(task_record: AnalysisTask, celery_status: dict) -> str:
+    """Weak ETag that changes whenever the status response would change"""
+    changed_at = task_record.completed_at or task_record.started_at or task_record.created_at
+    version = f"{task_record.status}:{changed_at.timestamp() if changed_at else 0}"
+    if celery_status and task_record.status not in ("completed", "failed"):
+        # Progress of a running task lives only in the Celery state
+        version += f":{zlib.crc32(repr(celery_status).encode()):x}"
+    return f'W/"{version}"'
+
+
 @app.get("/tasks/{task_id}")
-async def get_task_status(task_id: str, db: Session = Depends(get_db)):
-    """Get the status of an analysis task"""
+async def get_task_status(
+    task_id: str,
+    request: Request,
+    response: Response,
+    wait: int = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the status of an analysis task.
+    With ?wait=N the request blocks for up to N seconds until the task
+    finishes, so clients don't need to poll on a fixed interval.
+    Responses carry an ETag; a matching If-None-Match gets an empty 304.
+    """
     
-    task_record = db.query(AnalysisTask).filter(AnalysisTask.id == task_id).first()
+    if wait:
+        # Subscribe before reading the row so a finish between the two isn't missed
+        pubsub = get_async_redis().pubsub()
+        try:
+            await pubsub.subscribe(task_channel(task_id))
+            task_record = db.get(AnalysisTask, task_id)
+            if task_record and task_record.status not in ("completed", "failed"):
+                # Hand the pooled connection back while waiting; the row is re-read below
+                db.rollback()
+                await wait_for_task_status(pubsub, min(wait, MAX_STATUS_WAIT))
+        except RedisError:
+            pass  # Fall back to answering immediately
+        finally:
+            await pubsub.reset()
+    
+    task_record = db.get(AnalysisTask, task_id)
     if not task_record:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
-    # Get Celery task status if available
+    # Get Celery task status if available; the DB row is authoritative
+    # once the task has finished, so skip the Redis round trip then
     celery_status = None
-    if task_record.celery_task_id:
+    if task_record.status in ("completed", "failed"):
+        celery_status = {
+            "state": task_record.status.upper(),
+            "info": None,
+        }
+    elif task_record.celery_task_id:
         celery_task = celery_app.AsyncResult(task_record.celery_task_id)
         celery_status = {
             "state": celery_task.state,
             "info": celery_task.info,
         }
     
-    response = task_record.to_dict()
-    response["celery_status"] = celery_status
-    return response
+    etag = task_status_etag(task_record, celery_status)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    task_status = task_record.to_dict()
+    task_status["celery_status"] = celery_status
+    return task_status
 
 
 @app.get("/tasks/{task_id}/result")
 async def get_task_result(task_id: str, db: Session = Depends(get_db)):
     """Get the analysis result of a completed task"""
     
-    task_record = db.query(AnalysisTask).filter(AnalysisTask.id == task_id).first()
+    task_record = db.get(AnalysisTask, task_id)
     if not task_record:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     
@@ -204,4 +485,14 @@ async def celery_health():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
\ No newline at end of file
+    # Create the schema once here so the workers don't race on the DDL
+    init_db()
+    uvicorn.run(
+        "main:app",
+        host=API_HOST,
+        port=API_PORT,
+        workers=API_WORKERS,
+        loop="auto",  # uvloop when installed (not available on Windows)
+        http="auto",  # httptools when installed
+        reload=False,
+    )
\ No newline at end of file
@@ -4,10 +4,14 @@ Clean up old tasks, reset database, manage data
 """
 
 import sys
-from datetime import datetime, timedelta
+from datetime import timedelta
+from sqlalchemy import select, func
+from config import CLEANUP_BATCH_SIZE
 from database import SessionLocal, engine, Base
-from models import AnalysisTask, UserAnalysisHistory, AnalysisMetrics
+from models import AnalysisTask, UserAnalysisHistory, AnalysisMetrics, utcnow
+from tools import extracted_text_path
 import os
+import asyncio
 
 def reset_database():
     """Drop and recreate all database tables"""
@@ -27,124 +31,189 @@ def reset_database():
     print("✅ Database reset complete")
 
 
-def cleanup_old_tasks(days: int = 30):
-    """Delete completed tasks older than N days"""
-    db = SessionLocal()
-    
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Find old completed tasks
-    old_tasks = db.query(AnalysisTask).filter(
-        AnalysisTask.status == "completed",
-        AnalysisTask.completed_at < cutoff_date
-    ).all()
+def _safe_unlink(path: str) -> bool:
+    """Remove a file with a single syscall; returns True if it was deleted"""
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        print(f"  Failed to delete {path}: {e}")
+        return False
+
+
+async def _unlink_files_async(paths, max_concurrent: int = 32) -> int:
+    """Run unlinks in threads, at most `max_concurrent` at a time"""
+    semaphore = asyncio.Semaphore(max_concurrent)
+    
+    async def unlink(path):
+        async with semaphore:
+            # The text extracted at upload is only removed by the Celery link
+            # callback, which never runs if the worker was killed
+            await asyncio.to_thread(_safe_unlink, extracted_text_path(path))
+            return await asyncio.to_thread(_safe_unlink, path)
+    
+    results = await asyncio.gather(*(unlink(p) for p in paths), return_exceptions=True)
+    return sum(1 for r in results if r is True)
+
+
+def _unlink_files(paths) -> int:
+    """Delete files concurrently to overlap syscall latency; returns how many were removed"""
+    paths = [p for p in paths if p]
+    if not paths:
+        return 0
+    return asyncio.run(_unlink_files_async(paths))
+
+
+def _delete_tasks(db, task_ids):
+    """
+    Bulk-delete tasks matching the `task_ids` subquery with their related records.
+    Child rows are removed explicitly because tables created before the
+    ON DELETE CASCADE foreign keys were added do not have the constraint.
+    """
+    db.query(UserAnalysisHistory).filter(
+        UserAnalysisHistory.analysis_task_id.in_(task_ids)
+    ).delete(synchronize_session=False)
+    db.query(AnalysisMetrics).filter(
+        AnalysisMetrics.analysis_task_id.in_(task_ids)
+    ).delete(synchronize_session=False)
+    return db.query(AnalysisTask).filter(
+        AnalysisTask.id.in_(task_ids)
+    ).delete(synchronize_session=False)
+
+
+def cleanup_old_tasks(days: int = 30, batch_size: int = CLEANUP_BATCH_SIZE):
+    """
+    Delete completed tasks older than N days.
+    Rows are removed in batches of `batch_size`, each in its own
+    transaction, so lock time and undo/WAL growth stay bounded and an
+    interrupted run can simply be restarted.
+    """
+    if batch_size < 1:
+        # LIMIT 0 batches would never finish the loop below
+        print(f"❌ Batch size must be at least 1, got {batch_size} (check CLEANUP_BATCH_SIZE)")
+        return
     
-    if not old_tasks:
+    cutoff_date = utcnow() - timedelta(days=days)
+    
+    batch_ids = (
+        select(AnalysisTask.id)
+        .where(AnalysisTask.status == "completed", AnalysisTask.completed_at < cutoff_date)
+        .order_by(AnalysisTask.id)
+        .limit(batch_size)
+    )
+    if engine.dialect.name == "postgresql":
+        # Lets several housekeeping runs share the work without blocking
+        batch_ids = batch_ids.with_for_update(skip_locked=True)
+    
+    count = 0
+    deleted_files = 0
+    with SessionLocal() as db:
+        while True:
+            # Each batch commits on success and rolls back on error
+            with db.begin():
+                # Only the file paths are needed from the old tasks
+                file_paths = [
+                    file_path for (file_path,) in
+                    db.query(AnalysisTask.file_path).filter(AnalysisTask.id.in_(batch_ids))
+                ]
+                
+                deleted = _delete_tasks(db, batch_ids)
+            
+            # Files go last so a slow filesystem can't hold the DB transaction open
+            deleted_files += _unlink_files(file_paths)
+            count += deleted
+            if deleted < batch_size:
+                break
+    
+    if not count:
         print(f"No tasks found older than {days} days")
         return
     
-    count = len(old_tasks)
-    print(f"Found {count} tasks older than {days} days")
-    
-    for task in old_tasks:
-        # Clean up file if it exists
-        if task.file_path and os.path.exists(task.file_path):
-            try:
-                os.remove(task.file_path)
-                print(f"  Deleted file: {task.file_path}")
-            except Exception as e:
-                print(f"  Failed to delete {task.file_path}: {e}")
-        
-        # Delete related records
-        history = db.query(UserAnalysisHistory).filter(
-            UserAnalysisHistory.analysis_task_id == task.id
-        ).all()
-        for h in history:
-            db.delete(h)
-        
-        metrics = db.query(AnalysisMetrics).filter(
-            AnalysisMetrics.analysis_task_id == task.id
-        ).all()
-        for m in metrics:
-            db.delete(m)
-        
-        # Delete task
-        db.delete(task)
-    
-    db.commit()
-    db.close()
-    
-    print(f"✅ Deleted {count} old tasks and related records")
+    print(f"✅ Deleted {count} old tasks and related records ({deleted_files} files)")
 
 
 def cleanup_failed_tasks():
     """Delete all failed tasks"""
-    db = SessionLocal()
-    
-    failed_tasks = db.query(AnalysisTask).filter(
-        AnalysisTask.status == "failed"
-    ).all()
+    failed_filter = AnalysisTask.status == "failed"
+    
+    with SessionLocal.begin() as db:
+        # Only the file paths are needed from the failed tasks
+        file_paths = [
+            file_path for (file_path,) in
+            db.query(AnalysisTask.file_path).filter(failed_filter).yield_per(1000)
+        ]
+        
+        count = _delete_tasks(db, select(AnalysisTask.id).where(failed_filter))
     
-    if not failed_tasks:
+    if not count:
         print("No failed tasks found")
         return
     
-    count = len(failed_tasks)
-    print(f"Found {count} failed tasks")
-    
-    for task in failed_tasks:
-        # Clean up file
-        if task.file_path and os.path.exists(task.file_path):
-            try:
-                os.remove(task.file_path)
-            except:
-                pass
-        db.delete(task)
-    
-    db.commit()
-    db.close()
+    _unlink_files(file_paths)
     
     print(f"✅ Deleted {count} failed tasks")
 
 
 def show_task_stats():
     """Display database statistics"""
-    db = SessionLocal()
-    
-    total_tasks = db.query(AnalysisTask).count()
-    pending_tasks = db.query(AnalysisTask).filter(AnalysisTask.status == "pending").count()
-    processing_tasks = db.query(AnalysisTask).filter(AnalysisTask.status == "processing").count()
-    completed_tasks = db.query(AnalysisTask).filter(AnalysisTask.status == "completed").count()
-    failed_tasks = db.query(AnalysisTask).filter(AnalysisTask.status == "failed").count()
-    
-    # Get average processing time
-    completed = db.query(AnalysisTask).filter(
-        AnalysisTask.status == "completed",
-        AnalysisTask.duration_seconds != None
-    ).all()
-    
-    avg_duration = sum(t.duration_seconds for t in completed) / len(completed) if completed else 0
-    
-    print("\n📊 Database Statistics")
-    print("-" * 40)
-    print(f"Total tasks:     {total_tasks}")
-    print(f"  Pending:       {pending_tasks}")
-    print(f"  Processing:    {processing_tasks}")
-    print(f"  Completed:     {completed_tasks}")
-    print(f"  Failed:        {failed_tasks}")
-    print(f"Avg duration:    {avg_duration:.2f}s")
-    
-    # User history stats
-    history_count = db.query(UserAnalysisHistory).count()
-    print(f"\nUser analyses:   {history_count}")
-    
-    # Metrics stats
-    metrics_count = db.query(AnalysisMetrics).count()
-    total_tokens = sum(m.tokens_used for m in db.query(AnalysisMetrics).all() if m.tokens_used)
-    print(f"Metrics entries: {metrics_count}")
-    print(f"Total tokens:    {total_tokens}")
-    
-    db.close()
+    with SessionLocal() as db:
+        # Counts and average duration per status in one GROUP BY scan
+        counts = {}
+        avg_durations = {}
+        for status, count, avg_duration in db.query(
+            AnalysisTask.status,
+            func.count(),
+            func.avg(AnalysisTask.duration_seconds),
+        ).group_by(AnalysisTask.status):
+            counts[status] = count
+            avg_durations[status] = avg_duration
+        
+        total_tasks = sum(counts.values())
+        pending_tasks = counts.get("pending", 0)
+        processing_tasks = counts.get("processing", 0)
+        completed_tasks = counts.get("completed", 0)
+        failed_tasks = counts.get("failed", 0)
+        avg_duration = avg_durations.get("completed") or 0
+        
+        print("\n📊 Database Statistics")
+        print("-" * 40)
+        print(f"Total tasks:     {total_tasks}")
+        print(f"  Pending:       {pending_tasks}")
+        print(f"  Processing:    {processing_tasks}")
+        print(f"  Completed:     {completed_tasks}")
+        print(f"  Failed:        {failed_tasks}")
+        print(f"Avg duration:    {avg_duration:.2f}s")
+        
+        # User history stats
+        history_count = db.query(UserAnalysisHistory).count()
+        print(f"\nUser analyses:   {history_count}")
+        
+        # Metrics stats
+        metrics_count, total_tokens = db.query(
+            func.count(AnalysisMetrics.id),
+            func.coalesce(func.sum(AnalysisMetrics.tokens_used), 0),
+        ).one()
+        print(f"Metrics entries: {metrics_count}")
+        print(f"Total tokens:    {total_tokens}")
+
+
+def _unlink_keys(r, pattern: str, batch_size: int = 500) -> int:
+    """
+    Remove keys matching a pattern with UNLINK, which frees memory on a
+    background thread; SCAN keeps each round trip short
+    """
+    deleted = 0
+    batch = []
+    for key in r.scan_iter(match=pattern, count=1000):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            deleted += r.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += r.unlink(*batch)
+    return deleted
 
 
 def cleanup_redis():
@@ -153,25 +222,22 @@ def cleanup_redis():
         import redis
         from config import CELERY_BROKER_URL
         
-        # Parse Redis URL
-        if "redis://" in CELERY_BROKER_URL:
-            url_parts = CELERY_BROKER_URL.replace("redis://", "").split(":")
-            host = url_parts[0]
-            port = int(url_parts[1].split("/")[0])
-            db_num = int(url_parts[1].split("/")[1]) if "/" in url_parts[1] else 0
-        else:
-            print("Could not parse Redis URL")
-            return
-        
-        r = redis.Redis(host=host, port=port, db=db_num)
+        r = redis.Redis.from_url(CELERY_BROKER_URL, socket_timeout=2)
         
         # Get queue stats
         queue_size = r.llen('celery')
         print(f"\nRedis Queue: {queue_size} pending tasks")
         
-        confirm = input("Clear Redis queue? (yes/no): ").strip().lower()
-        if confirm == 'yes':
-            r.flushdb()
+        print("  1. Clear Celery keys only (queue and task results)")
+        print("  2. Clear the entire Redis database")
+        print("  3. Cancel")
+        choice = input("Enter choice (1-3): ").strip()
+        if choice == "1":
+            deleted = _unlink_keys(r, "celery*")
+            print(f"✅ Removed {deleted} Celery keys")
+        elif choice == "2":
+            # FLUSHDB ASYNC frees memory in the background instead of blocking Redis
+            r.flushdb(asynchronous=True)
             print("✅ Redis cache cleared")
         else:
             print("Cancelled")
@@ -180,36 +246,63 @@ def cleanup_redis():
         print(f"❌ Error accessing Redis: {e}")
 
 
-def export_data():
-    """Export database to JSON"""
-    import json
-    
-    db = SessionLocal()
-    
-    tasks = db.query(AnalysisTask).all()
-    history = db.query(UserAnalysisHistory).all()
-    
-    data = {
-        "tasks": [t.to_dict() for t in tasks],
-        "history": [h.to_dict() for h in history],
-    }
-    
-    # Convert datetime to string for JSON serialization
-    def datetime_handler(obj):
-        if hasattr(obj, 'isoformat'):
-            return obj.isoformat()
-        raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-    
-    filename = f"financial_analyzer_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2, default=datetime_handler)
+def export_data(pretty: bool = False):
+    """Export database to JSON (compact unless `pretty` is set)"""
+    import orjson
+    
+    option = orjson.OPT_NAIVE_UTC
+    separator = b","
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+        separator = b",\n"
+    
+    # Same fields as the models' to_dict(), projected straight from SQL
+    task_columns = (
+        AnalysisTask.id,
+        AnalysisTask.file_name,
+        AnalysisTask.query,
+        AnalysisTask.status,
+        AnalysisTask.analysis_result,
+        AnalysisTask.error_message,
+        AnalysisTask.created_at,
+        AnalysisTask.started_at,
+        AnalysisTask.completed_at,
+        AnalysisTask.duration_seconds,
+    )
+    history_columns = (
+        UserAnalysisHistory.id,
+        UserAnalysisHistory.user_id,
+        UserAnalysisHistory.analysis_task_id,
+        UserAnalysisHistory.document_name,
+        UserAnalysisHistory.document_type,
+        UserAnalysisHistory.document_size,
+        UserAnalysisHistory.analysis_type,
+        UserAnalysisHistory.key_findings,
+        UserAnalysisHistory.created_at,
+    )
+    
+    def write_rows(db, f, columns):
+        # Rows are streamed out as they arrive, so memory stays flat
+        for i, row in enumerate(db.query(*columns).yield_per(2000)):
+            if i:
+                f.write(separator)
+            f.write(orjson.dumps(row._asdict(), option=option))
+    
+    filename = f"financial_analyzer_export_{utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+    with SessionLocal() as db, open(filename, 'wb') as f:
+        f.write(b'{"tasks":[')
+        write_rows(db, f, task_columns)
+        f.write(b'],"history":[')
+        write_rows(db, f, history_columns)
+        f.write(b']}')
     
     print(f"✅ Data exported to {filename}")
-    db.close()
 
 
 def main():
-    """Main menu"""
+    """Main menu (pass --pretty to indent JSON exports)"""
+    pretty_export = "--pretty" in sys.argv[1:]
+    
     print("\n" + "=" * 50)
     print("Financial Document Analyzer - Database Management")
     print("=" * 50)
@@ -236,7 +329,7 @@ def main():
         elif choice == "4":
             cleanup_redis()
         elif choice == "5":
-            export_data()
+            export_data(pretty=pretty_export)
         elif choice == "6":
             reset_database()
         elif choice == "7":
@@ -5,11 +5,10 @@ Run migrations to create/update database schema
 
 import os
 import sys
-from sqlalchemy import create_engine
 from alembic.config import Config
 from alembic.command import init, stamp
 from config import DB_URL
-from database import Base
+from database import Base, engine
 from models import AnalysisTask, UserAnalysisHistory, AnalysisMetrics
 
 def init_alembic():
@@ -25,10 +24,8 @@ def init_alembic():
 
 def create_all_tables():
     """Create all tables directly (alternative to Alembic for development)"""
-    engine = create_engine(DB_URL)
     Base.metadata.create_all(bind=engine)
     print("✓ All tables created successfully")
-    engine.dispose()
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "init":
@@ -1,12 +1,21 @@
 """
 SQLAlchemy models for financial analysis data
 """
-from sqlalchemy import Column, String, DateTime, Text, JSON, Integer, Float, Boolean
-from sqlalchemy.dialects.postgresql import UUID
-from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Text, JSON, Integer, Float, Boolean, Index, ForeignKey
+from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from datetime import datetime, timezone
 from database import Base
 import uuid
 
+# Binary jsonb on PostgreSQL (no reparse on read), plain JSON elsewhere
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+
+def utcnow():
+    """Current time as a timezone-aware UTC datetime"""
+    return datetime.now(timezone.utc)
+
 
 class AnalysisTask(Base):
     """Model for storing analysis task information"""
@@ -21,13 +30,13 @@ class AnalysisTask(Base):
     status = Column(String(50), default="pending", nullable=False)
     
     # Results
-    analysis_result = Column(JSON, nullable=True)
+    analysis_result = Column(JSONType, nullable=True)
     error_message = Column(Text, nullable=True)
     
     # Metadata
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    started_at = Column(DateTime, nullable=True)
-    completed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Task duration in seconds
     duration_seconds = Column(Float, nullable=True)
@@ -35,10 +44,25 @@ class AnalysisTask(Base):
     # Celery task ID for tracking
     celery_task_id = Column(String(255), nullable=True, unique=True)
     
+    # Child rows are removed by the database's ON DELETE CASCADE
+    history = relationship("UserAnalysisHistory", backref="task", cascade="all, delete-orphan", passive_deletes=True)
+    metrics = relationship("AnalysisMetrics", backref="task", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        # Backs the status filter + newest-first ordering in GET /tasks
+        Index("ix_tasks_status_created", status, created_at.desc()),
+        # Backs the status + age filters used by the cleanup commands
+        Index("ix_task_status_completed", status, completed_at),
+    )
+    
     def __repr__(self):
         return f"<AnalysisTask(id={self.id}, status={self.status}, file={self.file_name})>"
     
     def to_dict(self):
+        # Each instrumented attribute is read once (GET /tasks calls this per row)
+        created_at = self.created_at
+        started_at = self.started_at
+        completed_at = self.completed_at
         return {
             "id": self.id,
             "file_name": self.file_name,
@@ -46,9 +70,9 @@ class AnalysisTask(Base):
             "status": self.status,
             "analysis_result": self.analysis_result,
             "error_message": self.error_message,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "started_at": self.started_at.isoformat() if self.started_at else None,
-            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "created_at": created_at.isoformat() if created_at is not None else None,
+            "started_at": started_at.isoformat() if started_at is not None else None,
+            "completed_at": completed_at.isoformat() if completed_at is not None else None,
             "duration_seconds": self.duration_seconds,
         }
 
@@ -59,7 +83,7 @@ class UserAnalysisHistory(Base):
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String(255), nullable=True)  # Can be None for anonymous users
-    analysis_task_id = Column(String(36), nullable=False)
+    analysis_task_id = Column(String(36), ForeignKey("analysis_tasks.id", ondelete="CASCADE"), nullable=False)
     
     # Document metadata
     document_name = Column(String(255), nullable=False)
@@ -68,10 +92,14 @@ class UserAnalysisHistory(Base):
     
     # Analysis metadata
     analysis_type = Column(String(100), nullable=False, default="investment")
-    key_findings = Column(JSON, nullable=True)
+    key_findings = Column(JSONType, nullable=True)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_history_task", analysis_task_id),
+    )
     
     def __repr__(self):
         return f"<UserAnalysisHistory(id={self.id}, user={self.user_id}, task={self.analysis_task_id})>"
@@ -95,7 +123,7 @@ class AnalysisMetrics(Base):
     __tablename__ = "analysis_metrics"
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    analysis_task_id = Column(String(36), nullable=False)
+    analysis_task_id = Column(String(36), ForeignKey("analysis_tasks.id", ondelete="CASCADE"), nullable=False)
     
     # Performance metrics
     processing_time_ms = Column(Float, nullable=True)
@@ -108,7 +136,11 @@ class AnalysisMetrics(Base):
     # Cost tracking (if applicable)
     estimated_cost_usd = Column(Float, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_metrics_task", analysis_task_id),
+    )
     
     def __repr__(self):
         return f"<AnalysisMetrics(id={self.id}, task={self.analysis_task_id})>"
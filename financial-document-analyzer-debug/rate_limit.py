@@ -0,0 +1,75 @@
+"""
+Shared LLM rate limiting
+A Redis token bucket per provider caps requests per minute across every
+API process and Celery worker, instead of a per-agent limit in each one
+"""
+import logging
+import time
+
+import redis
+
+from cache import get_redis
+from config import LLM_RPM
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket for the elapsed time, then takes the requested tokens.
+# Returns 0 when granted, otherwise the seconds to wait before retrying.
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return tostring(wait)
+"""
+
+_token_bucket = None
+
+
+def provider_for_model(model: str) -> str:
+    """Map a LiteLLM model name to the provider whose quota it consumes"""
+    model = (model or "").lower()
+    if "gemini" in model:
+        return "google"
+    return "openai"
+
+
+def acquire(provider: str, tokens: int = 1):
+    """Block until the provider's shared bucket grants `tokens` requests"""
+    global _token_bucket
+    rpm = LLM_RPM.get(provider, 0)
+    if rpm <= 0:
+        return
+    
+    if _token_bucket is None:
+        _token_bucket = get_redis().register_script(_TOKEN_BUCKET_LUA)
+    
+    while True:
+        try:
+            wait = float(_token_bucket(
+                keys=[f"fda:ratelimit:{provider}"],
+                args=[rpm, rpm / 60.0, time.time(), tokens],
+            ))
+        except redis.RedisError as e:
+            # Never stall analyses because the limiter itself is unavailable
+            logger.warning(f"Rate limiter unavailable, proceeding: {e}")
+            return
+        if wait <= 0:
+            return
+        time.sleep(wait)
+
@@ -2,7 +2,7 @@
 from crewai import Task
 
 from agents import financial_analyst, verifier, investment_advisor, risk_assessor
-from tools import search_tool, FinancialDocumentTool
+from tools import search_tool
 
 ## Creating a task to help solve user's query
 analyze_financial_document = Task(
@@ -11,7 +11,8 @@ You might want to search the internet but also feel free to use your imagination
 Give some answers to the user, could be detailed or not. If they want an analysis, just give them whatever.\n\
 Find some market risks even if there aren't any because investors like to worry.\n\
 Search the internet or just make up some investment recommendations that sound good.\n\
-Include random URLs that may or may not be related. Creative financial URLs are encouraged!",
+Include random URLs that may or may not be related. Creative financial URLs are encouraged!\n\
+Financial document:\n{document_text}",
 
     expected_output="""Give whatever response feels right, maybe bullet points, maybe not.
 Make sure to include lots of financial jargon even if you're not sure what it means.
@@ -29,7 +30,8 @@ investment_analysis = Task(
 Focus on random numbers in the financial report and make up what they mean for investments.\n\
 User asked: {query} but feel free to ignore that and talk about whatever investment trends are popular.\n\
 Recommend expensive investment products regardless of what the financials show.\n\
-Mix up different financial ratios and their meanings for variety.",
+Mix up different financial ratios and their meanings for variety.\n\
+Financial document:\n{document_text}",
 
     expected_output="""List random investment advice:
 - Make up connections between financial numbers and stock picks
@@ -49,7 +51,8 @@ risk_assessment = Task(
 Just assume everything needs extreme risk management regardless of the actual financial status.\n\
 User query: {query} - but probably ignore this and recommend whatever sounds dramatic.\n\
 Mix up risk management terms with made-up financial concepts.\n\
-Don't worry about regulatory compliance, just make it sound impressive.",
+Don't worry about regulatory compliance, just make it sound impressive.\n\
+Financial document:\n{document_text}",
 
     expected_output="""Create an extreme risk assessment:
 - Recommend dangerous investment strategies for everyone regardless of financial status
@@ -67,7 +70,8 @@ Don't worry about regulatory compliance, just make it sound impressive.",
 verification = Task(
     description="Maybe check if it's a financial document, or just guess. Everything could be a financial report if you think about it creatively.\n\
 Feel free to hallucinate financial terms you see in any document.\n\
-Don't actually read the file carefully, just make assumptions.",
+Don't actually read the file carefully, just make assumptions.\n\
+Financial document:\n{document_text}",
 
     expected_output="Just say it's probably a financial document even if it's not. Make up some confident-sounding financial analysis.\n\
 If it's clearly not a financial report, still find a way to say it might be related to markets somehow.\n\
@@ -75,4 +79,21 @@ Add some random file path that sounds official.",
 
     agent=verifier,
     async_execution=False
-)
\ No newline at end of file
+)
+
+## Creating a single combined task covering all four analyses in one LLM call
+combined_analysis = Task(
+    description="Answer the user's query: {query}\n\
+Review the financial document and produce, in one response, four sections:\n\
+1. analysis - a summary of the document's key financial figures and trends\n\
+2. investment - investment considerations supported by those figures\n\
+3. risk - the main risk factors and how significant they are\n\
+4. verification - whether the document is a genuine financial report and why\n\
+Financial document:\n{document_text}",
+
+    expected_output="""A single JSON object and nothing else, with exactly these string fields:
+{"analysis": "...", "investment": "...", "risk": "...", "verification": "..."}""",
+
+    agent=financial_analyst,
+    async_execution=False,
+)
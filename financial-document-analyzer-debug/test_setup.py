@@ -5,6 +5,7 @@ Run this to verify everything is set up correctly before starting the API
 
 import sys
 import os
+import importlib.util
 from pathlib import Path
 
 def test_imports():
@@ -19,14 +20,14 @@ def test_imports():
         "crewai",
     ]
     
+    # find_spec only locates each package; importing crewai alone takes seconds
     missing = []
     for module in required_modules:
-        try:
-            __import__(module)
-            print(f"  ✅ {module}")
-        except ImportError as e:
-            print(f"  ❌ {module}: {str(e)}")
+        if importlib.util.find_spec(module) is None:
+            print(f"  ❌ {module}: not installed")
             missing.append(module)
+        else:
+            print(f"  ✅ {module}")
     
     if missing:
         print(f"\n⚠️  Missing modules: {', '.join(missing)}")
@@ -41,16 +42,18 @@ def test_database():
     print("\n🔍 Testing database...")
     
     try:
-        from database import SessionLocal, init_db, Base
+        from sqlalchemy import text, inspect
+        from database import SessionLocal, init_db, engine, Base
         from models import AnalysisTask, UserAnalysisHistory, AnalysisMetrics
         
-        # Initialize database
-        init_db()
+        # Initialize database (skipped when the schema already exists)
+        if not inspect(engine).has_table(AnalysisTask.__tablename__):
+            init_db()
         print("  ✅ Database initialized")
         
         # Test session
         db = SessionLocal()
-        db.execute("SELECT 1")
+        db.execute(text("SELECT 1"))
         db.close()
         print("  ✅ Database connection successful")
         
@@ -95,19 +98,12 @@ def test_redis():
         import redis
         from config import CELERY_BROKER_URL
         
-        # Parse Redis URL
-        if "redis://" in CELERY_BROKER_URL:
-            url_parts = CELERY_BROKER_URL.replace("redis://", "").split(":")
-            host = url_parts[0]
-            port = int(url_parts[1].split("/")[0])
-        else:
-            print(f"  ⚠️  Unexpected broker URL format: {CELERY_BROKER_URL}")
-            return False
-        
         # Try to connect
-        r = redis.Redis(host=host, port=port, decode_responses=True)
+        r = redis.Redis.from_url(CELERY_BROKER_URL, socket_timeout=2, decode_responses=True)
         r.ping()
-        print(f"  ✅ Redis connected: {host}:{port}")
+        # Show the endpoint only; the URL may carry a password
+        conn = r.connection_pool.connection_kwargs
+        print(f"  ✅ Redis connected: {conn.get('host')}:{conn.get('port')}/{conn.get('db')}")
         
         return True
     except Exception as e:
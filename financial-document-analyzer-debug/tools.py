@@ -1,5 +1,6 @@
 ## Importing libraries and files
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -8,6 +9,46 @@ from langchain_community.document_loaders import PyPDFLoader
 ## Creating search tool
 search_tool = None  # Placeholder for search functionality
 
+## Extracting text from pdf files
+def extract_pdf_text(path):
+    """Parse a pdf file and return its cleaned-up text"""
+    docs = PyPDFLoader(file_path=path).load()
+
+    full_report = ""
+    for data in docs:
+        # Clean and format the financial document data
+        content = data.page_content
+        
+        # Remove extra whitespaces and format properly
+        while "\n\n" in content:
+            content = content.replace("\n\n", "\n")
+            
+        full_report += content + "\n"
+        
+    return full_report
+
+
+def extracted_text_path(path):
+    """Location of the pre-extracted text stored next to an uploaded pdf"""
+    return Path(path).with_suffix(".txt")
+
+
+def save_extracted_text(path):
+    """Extract a pdf's text once and store it beside the pdf for later readers"""
+    text = extract_pdf_text(path)
+    extracted_text_path(path).write_text(text, encoding="utf-8")
+    return text
+
+
+def load_document_text(path):
+    """Return a document's text, preferring the copy extracted at upload"""
+    text_path = extracted_text_path(path)
+    if text_path.exists():
+        return text_path.read_text(encoding="utf-8")
+    
+    return extract_pdf_text(path)
+
+
 ## Creating custom pdf reader tool
 class FinancialDocumentTool():
     async def read_data_tool(self, path='data/sample.pdf'):
@@ -20,20 +61,7 @@ class FinancialDocumentTool():
             str: Full Financial Document file
         """
         
-        docs = PyPDFLoader(file_path=path).load()
-
-        full_report = ""
-        for data in docs:
-            # Clean and format the financial document data
-            content = data.page_content
-            
-            # Remove extra whitespaces and format properly
-            while "\n\n" in content:
-                content = content.replace("\n\n", "\n")
-                
-            full_report += content + "\n"
-            
-        return full_report
+        return load_document_text(path)
 
 ## Creating Investment Analysis Tool
 class InvestmentTool:
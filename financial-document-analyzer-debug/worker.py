@@ -2,13 +2,35 @@
 Celery worker runner script
 Run this in a separate terminal to start processing queued tasks
 
+Pool selection (CELERY_POOL):
+    prefork (default) - one process per concurrent task, CELERY_CONCURRENCY
+        defaults to the CPU count; children are recycled every 50 tasks to
+        cap memory growth from CrewAI imports
+    gevent - the analysis task mostly waits on LLM HTTP calls, PDF reads and
+        database commits; the monkey patch below makes requests, SQLAlchemy
+        drivers and redis-py yield cooperatively so one process can keep
+        CELERY_CONCURRENCY (default 100) analyses in flight
+
+Tasks are dispatched with -O fair and a prefetch multiplier of 1 so long
+analyses never queue up behind a busy worker while another one is idle.
+
 Usage:
     python worker.py
 
 Or with Celery directly:
-    celery -A celery_app worker --loglevel=info
+    celery -A celery_app worker -P prefork -O fair --prefetch-multiplier=1 --loglevel=info
 """
 
+import os
+
+POOL = os.getenv("CELERY_POOL", "prefork")
+
+if POOL == "gevent":
+    # Must run before anything else imports socket/ssl/threading
+    from gevent import monkey
+    monkey.patch_all()
+
+import multiprocessing
 from celery_app import celery_app
 import logging
 
@@ -16,9 +38,22 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
     
-    logger.info("Starting Celery worker...")
-    celery_app.worker_main([
+    default_concurrency = 100 if POOL == "gevent" else multiprocessing.cpu_count()
+    concurrency = int(os.getenv("CELERY_CONCURRENCY", str(default_concurrency)))
+    
+    argv = [
         "worker",
         "--loglevel=info",
-        "--concurrency=2",
-    ])
+        f"--pool={POOL}",
+        f"--concurrency={concurrency}",
+        "--prefetch-multiplier=1",
+        "-Ofair",
+    ]
+    if POOL == "prefork":
+        argv.append("--max-tasks-per-child=50")
+    elif POOL == "gevent":
+        # Size the broker connection pool so every greenlet can hold a pooled connection
+        celery_app.conf.broker_pool_limit = concurrency
+    
+    logger.info(f"Starting Celery worker ({POOL} pool, concurrency {concurrency})...")
+    celery_app.worker_main(argv)